@@ -0,0 +1,88 @@
+"""
+Time to first fast response of a freshly started service.
+
+Starts the service, then measures how long it takes until /health/ready reports ready,
+until the first conversion is answered and until a conversion is answered faster than the threshold.
+Redis must be running, see `make redis`.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from http import HTTPStatus
+
+from aiohttp import ClientError, ClientSession
+
+BASE_URL = "http://127.0.0.1:8080"
+CONVERT_PAYLOAD = {
+    "currency_from": "BTC",
+    "currency_to": "USDT",
+    "exchange": None,
+    "amount": 1,
+    "cache_max_seconds": 60,
+}
+
+
+async def wait_until_ready(session: ClientSession, started_at: float, timeout: float) -> float | None:
+    while time.monotonic() - started_at < timeout:
+        try:
+            async with session.get(f"{BASE_URL}/health/ready") as response:
+                if response.status == HTTPStatus.OK:
+                    return time.monotonic() - started_at
+        except ClientError:
+            pass
+        await asyncio.sleep(0.01)
+    return None
+
+
+async def wait_until_fast(
+    session: ClientSession, started_at: float, timeout: float, threshold: float
+) -> tuple[float | None, float | None]:
+    first_response = None
+    while time.monotonic() - started_at < timeout:
+        request_started_at = time.monotonic()
+        try:
+            async with session.post(f"{BASE_URL}/api/v1/convert", json=CONVERT_PAYLOAD) as response:
+                await response.read()
+                status = response.status
+        except ClientError:
+            await asyncio.sleep(0.01)
+            continue
+        now = time.monotonic()
+        if status == HTTPStatus.OK:
+            first_response = first_response or now - started_at
+            if now - request_started_at <= threshold:
+                return first_response, now - started_at
+    return first_response, None
+
+
+def format_seconds(seconds: float | None) -> str:
+    return "timed out" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+
+async def main(threshold_ms: int, timeout: float) -> None:
+    started_at = time.monotonic()
+    service = await asyncio.create_subprocess_exec(
+        sys.executable, "src/app.py", stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        async with ClientSession() as session:
+            ready, (first_response, first_fast_response) = await asyncio.gather(
+                wait_until_ready(session, started_at, timeout),
+                wait_until_fast(session, started_at, timeout, threshold_ms / 1000),
+            )
+    finally:
+        service.terminate()
+        await service.wait()
+    print(f"ready:                {format_seconds(ready)}")
+    print(f"first response:       {format_seconds(first_response)}")
+    print(f"first fast response:  {format_seconds(first_fast_response)} (<= {threshold_ms} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold-ms", type=int, default=50, help="Response time considered fast")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for the service")
+    args = parser.parse_args()
+    asyncio.run(main(args.threshold_ms, args.timeout))
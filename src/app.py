@@ -1,10 +1,16 @@
+import asyncio
+
 from aiohttp import client, web
 from pydantic import ValidationError
 from redis.asyncio import Redis
 
 from common import (
-    error_handling_middleware,
+    AdmissionLimiter,
+    AdmissionSettings,
     ErrorHandlerRegistry,
+    Overloaded,
+    error_handling_middleware,
+    overloaded_error_handler,
     pydantic_error_handler,
 )
 from converter.cache import ExchangeClientCacheProxy, ExchangeRateCache, RedisSettings
@@ -13,6 +19,11 @@ from converter.errors import register_exchange_errors
 from converter.models import Exchange
 from converter.routes import convert_app
 from converter.service import ConvertService
+from converter.shared import LeaderElection, SharedRateTable, SharedRateTableSettings
+from converter.snapshot import SnapshotFile, SnapshotRefresher, SnapshotSettings
+from converter.warmup import WarmUp
+from health import health_app
+from tracing import InMemorySpanExporter, Tracer, TracingSettings, tracing_middleware
 
 
 async def on_startup(app: web.Application) -> None:
@@ -25,15 +36,64 @@ async def on_startup(app: web.Application) -> None:
         decode_responses=True,
     )
     exchange_rate_cache = ExchangeRateCache(redis, redis_settings.ttl)
+    snapshot_settings = SnapshotSettings()
+    shared_table_settings = SharedRateTableSettings()
+    shared_table = None
+    if shared_table_settings.enabled:
+        shared_table_settings.check_refresh_interval(snapshot_settings.refresh_interval)
+        app["shared_table"] = shared_table = SharedRateTable.open(
+            shared_table_settings.path, shared_table_settings.size
+        )
+    warm_cache_on_fetch = not snapshot_settings.refresh_interval
+    exchange_clients = {
+        Exchange.BINANCE: ExchangeClientCacheProxy(
+            BinanceExchangeClient(http_session), exchange_rate_cache, shared_table, warm_cache_on_fetch
+        ),
+        Exchange.KUCOIN: ExchangeClientCacheProxy(
+            KuCoinExchangeClient(http_session), exchange_rate_cache, shared_table, warm_cache_on_fetch
+        ),
+    }
+    admission_settings = AdmissionSettings()
+    app["admission_limiter"] = AdmissionLimiter(
+        admission_settings.limit,
+        admission_settings.queue_limit,
+        admission_settings.queue_timeout,
+        admission_settings.retry_after,
+    )
     app["convert_service"] = ConvertService(
-        {
-            Exchange.BINANCE: ExchangeClientCacheProxy(BinanceExchangeClient(http_session), exchange_rate_cache),
-            Exchange.KUCOIN: ExchangeClientCacheProxy(KuCoinExchangeClient(http_session), exchange_rate_cache),
-        }
+        exchange_clients,
+        AdmissionLimiter(
+            admission_settings.non_direct_limit,
+            admission_settings.non_direct_queue_limit,
+            admission_settings.queue_timeout,
+            admission_settings.retry_after,
+        ),
+    )
+    snapshot_file = SnapshotFile(snapshot_settings.file) if snapshot_settings.file else None
+    app["warm_up"] = warm_up = WarmUp(
+        exchange_clients, exchange_rate_cache, shared_table=shared_table, snapshot_file=snapshot_file
     )
+    app["warm_up_task"] = asyncio.create_task(warm_up.run())
+    if snapshot_settings.refresh_interval:
+        leader_election = None
+        if shared_table:
+            app["leader_election"] = leader_election = LeaderElection(
+                redis.lock(shared_table_settings.lock_name, timeout=shared_table_settings.lock_timeout)
+            )
+        snapshot_refresher = SnapshotRefresher(
+            exchange_clients, snapshot_settings.refresh_interval, shared_table, leader_election, snapshot_file
+        )
+        app["snapshot_refresher_task"] = asyncio.create_task(snapshot_refresher.run())
 
 
 async def on_cleanup(app: web.Application) -> None:
+    app["warm_up_task"].cancel()
+    if snapshot_refresher_task := app.get("snapshot_refresher_task"):
+        snapshot_refresher_task.cancel()
+    if leader_election := app.get("leader_election"):
+        await leader_election.resign()
+    if shared_table := app.get("shared_table"):
+        shared_table.close()
     await app["http_session"].close()
     await app["redis"].aclose()
 
@@ -41,12 +101,22 @@ async def on_cleanup(app: web.Application) -> None:
 async def create_app() -> web.Application:
     error_handler_registry = ErrorHandlerRegistry()
     error_handler_registry.add_handler(ValidationError, pydantic_error_handler)  # type: ignore
+    error_handler_registry.add_handler(Overloaded, overloaded_error_handler)  # type: ignore
     register_exchange_errors(error_handler_registry)
-    app = web.Application(middlewares=[error_handling_middleware])
+    tracing_settings = TracingSettings()
+    app = web.Application(middlewares=[tracing_middleware, error_handling_middleware])
     app["error_handler_registry"] = error_handler_registry
+    app["tracer"] = Tracer(
+        InMemorySpanExporter(tracing_settings.max_spans),
+        tracing_settings.enabled,
+        tracing_settings.sample_rate,
+        tracing_settings.profiling_enabled,
+        tracing_settings.profile_sample_rate,
+    )
     app.on_startup.append(on_startup)
     app.on_cleanup.append(on_cleanup)
     app.add_subapp("/api/v1/convert", convert_app)
+    app.add_subapp("/health", health_app)
     return app
 
 
@@ -1,4 +1,10 @@
+import asyncio
+import heapq
+import itertools
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
+from enum import IntEnum
 from http import HTTPStatus
 from typing import Awaitable, Callable
 
@@ -6,12 +12,21 @@ from aiohttp import web
 from aiohttp.typedefs import Handler
 from aiohttp.web_request import Request
 from pydantic import ValidationError
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from tracing import span
 
 
 class ApplicationError(Exception):
     """Code error. If ApplicationError is raised there is a bug in the code."""
 
 
+class Overloaded(Exception):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Service is overloaded")
+        self.retry_after = retry_after
+
+
 ErrorHandler = Callable[[Exception], Awaitable[web.StreamResponse]]
 
 
@@ -41,5 +56,96 @@ async def error_handling_middleware(request: Request, handler: Handler) -> web.S
         return await error_handler_registry.handle(exc)
 
 
+class AdmissionSettings(BaseSettings):
+    limit: int = 100
+    non_direct_limit: int = 10
+    queue_limit: int = 100  # Requests beyond it are rejected at once instead of holding the connection
+    non_direct_queue_limit: int = 10
+    queue_timeout: float = 0.5  # Seconds a request may wait for a free slot before it is rejected
+    retry_after: int = 1
+
+    model_config = SettingsConfigDict(env_prefix="admission_")
+
+
+class Priority(IntEnum):
+    HIGH = 0
+    LOW = 1
+
+
+AdmissionPriorityGetter = Callable[[Request], Awaitable[Priority]]
+
+
+@dataclass
+class AdmissionLimiter:
+    """
+    Bounded concurrency. Waiting requests are admitted by priority and rejected when their queue time runs out.
+    Requests that don't fit into the queue are rejected at once.
+    """
+
+    limit: int
+    queue_limit: int
+    queue_timeout: float
+    retry_after: int
+    _active: int = field(default=0, init=False, repr=False)
+    _waiters: list[tuple[Priority, int, asyncio.Future]] = field(default_factory=list, init=False, repr=False)
+    _counter: itertools.count = field(default_factory=itertools.count, init=False, repr=False)
+
+    @asynccontextmanager
+    async def admit(self, priority: Priority = Priority.HIGH) -> AsyncIterator[None]:
+        with span("admission.queue", priority=priority.name):
+            await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self._active < self.limit and not self._waiters:
+            self._active += 1
+            return
+        if len(self._waiters) >= self.queue_limit:
+            raise Overloaded(self.retry_after)
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._counter), future)
+        heapq.heappush(self._waiters, waiter)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await future
+        except BaseException as exc:
+            if future.done() and not future.cancelled():
+                self._release()  # The slot was handed over at the same moment, pass it on
+            elif waiter in self._waiters:  # Cancelled waiters may already be popped and skipped by _release
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            if isinstance(exc, TimeoutError):
+                raise Overloaded(self.retry_after) from None
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # Hand the slot over to the waiter
+                return
+        self._active -= 1
+
+
+@web.middleware
+async def admission_control_middleware(request: Request, handler: Handler) -> web.StreamResponse:
+    admission_limiter: AdmissionLimiter = request.config_dict["admission_limiter"]
+    get_priority: AdmissionPriorityGetter | None = request.config_dict.get("admission_priority_getter")
+    priority = await get_priority(request) if get_priority else Priority.HIGH
+    async with admission_limiter.admit(priority):
+        return await handler(request)
+
+
+async def overloaded_error_handler(exception: Overloaded) -> web.StreamResponse:
+    return web.Response(
+        text=str(exception),
+        status=HTTPStatus.SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(exception.retry_after)},
+    )
+
+
 async def pydantic_error_handler(exception: ValidationError) -> web.StreamResponse:
     return web.json_response(exception.errors(), status=HTTPStatus.BAD_REQUEST)
@@ -1,5 +1,8 @@
+import asyncio
+import contextvars
 import json
-from dataclasses import asdict, dataclass
+import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from decimal import Decimal
 
@@ -8,6 +11,10 @@ from redis.asyncio import Redis
 
 from converter.client import ExchangeClient, ExchangeClientHTTPBase
 from converter.models import Exchange, ExchangeRate
+from converter.shared import SharedRateTable
+from tracing import span
+
+logger = logging.getLogger(__name__)
 
 
 class RedisSettings(BaseSettings):
@@ -26,42 +33,182 @@ class ExchangeRateCache:
 
     async def set(self, rate: ExchangeRate) -> None:
         key = self.generate_key(rate.currency_from, rate.currency_to, rate.exchange)
-        raw_rate = asdict(rate)
-        raw_rate["updated_at"] = int(raw_rate["updated_at"].timestamp())
-        raw_rate["rate"] = str(raw_rate["rate"])
-        await self.redis.set(key, json.dumps(raw_rate), ex=self.ttl)
+        with span("redis.set", key=key):
+            await self.redis.set(key, self._dump(rate), ex=self.ttl)
 
     async def get(self, currency_from: str, currency_to: str, exchange: Exchange) -> ExchangeRate | None:
         key = self.generate_key(currency_from, currency_to, exchange)
-        raw_rate = await self.redis.get(key)
+        with span("redis.get", key=key):
+            raw_rate = await self.redis.get(key)
         if not raw_rate:
             return None
-        raw_rate = json.loads(raw_rate)
-        raw_rate["updated_at"] = datetime.fromtimestamp(raw_rate["updated_at"])
-        raw_rate["rate"] = Decimal(raw_rate["rate"])
-        return ExchangeRate(**raw_rate)
+        return self._load(raw_rate)
+
+    async def set_snapshot(self, exchange: Exchange, rates: list[ExchangeRate]) -> None:
+        """
+        Replace all the rates listed on the exchange in two round trips: the previous snapshot set is read,
+        then the rates are written in one pipeline. Both directions of each pair are cached.
+        Only listed pairs are kept in the snapshot set, so rates of delisted pairs are removed in both directions.
+        The read and the pipeline are not atomic: if two workers write snapshots at once,
+        a pair delisted in between may be kept until its TTL runs out.
+        """
+        snapshot_key = self.generate_snapshot_key(exchange)
+        listed_keys = {self.generate_key(rate.currency_from, rate.currency_to, exchange) for rate in rates}
+        with span("redis.set_snapshot", exchange=exchange, rates=len(rates)):
+            cached_keys: set[str] = await self.redis.smembers(snapshot_key)  # type: ignore[assignment]
+            delisted_keys = cached_keys - listed_keys
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for rate in rates:
+                    reversed_rate = rate.reversed
+                    pipe.set(
+                        self.generate_key(rate.currency_from, rate.currency_to, exchange), self._dump(rate), ex=self.ttl
+                    )
+                    pipe.set(
+                        self.generate_key(reversed_rate.currency_from, reversed_rate.currency_to, exchange),
+                        self._dump(reversed_rate),
+                        ex=self.ttl,
+                    )
+                if delisted_keys:
+                    pipe.delete(*delisted_keys, *(self._reverse_key(key) for key in delisted_keys))
+                pipe.delete(snapshot_key)
+                if listed_keys:
+                    pipe.sadd(snapshot_key, *listed_keys)
+                    pipe.expire(snapshot_key, self.ttl)
+                await pipe.execute()
+
+    async def get_snapshot(self, exchange: Exchange) -> list[ExchangeRate]:
+        """Get the rates of the pairs listed on the exchange, in the direction they are listed"""
+        with span("redis.get_snapshot", exchange=exchange):
+            keys = await self.redis.smembers(self.generate_snapshot_key(exchange))
+            if not keys:
+                return []
+            raw_rates = await self.redis.mget(keys)
+        return [self._load(raw_rate) for raw_rate in raw_rates if raw_rate]
 
     @staticmethod
     def generate_key(currency_from: str, currency_to: str, exchange: Exchange) -> str:
         return f"{currency_from}:{currency_to}:{exchange}"
 
+    @staticmethod
+    def generate_snapshot_key(exchange: Exchange) -> str:
+        return f"snapshot:{exchange}"
+
+    @staticmethod
+    def _reverse_key(key: str) -> str:
+        currency_from, currency_to, exchange = key.split(":")
+        return f"{currency_to}:{currency_from}:{exchange}"
+
+    @staticmethod
+    def _dump(rate: ExchangeRate) -> str:
+        return json.dumps(
+            {
+                "currency_from": rate.currency_from,
+                "currency_to": rate.currency_to,
+                "exchange": rate.exchange,
+                "rate": str(rate.rate),
+                "updated_at": int(rate.updated_at.timestamp()),
+                "_intermediate": rate._intermediate,
+            }
+        )
+
+    @staticmethod
+    def _load(data: str | bytes) -> ExchangeRate:
+        raw_rate = json.loads(data)
+        raw_rate["updated_at"] = datetime.fromtimestamp(raw_rate["updated_at"])
+        raw_rate["rate"] = Decimal(raw_rate["rate"])
+        return ExchangeRate(**raw_rate)
+
 
 @dataclass
 class ExchangeClientCacheProxy(ExchangeClient):
     client: ExchangeClientHTTPBase
     cache: ExchangeRateCache
+    shared_table: SharedRateTable | None = None
+    warm_cache_on_fetch: bool = True  # Disabled when the snapshot refresher warms the cache instead
+    _snapshot: list[ExchangeRate] = field(default_factory=list, init=False, repr=False)
+    _warm_cache_tasks: set[asyncio.Task] = field(default_factory=set, init=False, repr=False)
+    _fetch_snapshot_task: asyncio.Task | None = field(default=None, init=False, repr=False)
 
     async def get_direct_rate(self, currency_from: str, currency_to: str, **kwargs) -> ExchangeRate:
         cache_max_seconds = kwargs.get("cache_max_seconds")
         if cache_max_seconds:
+            if self.shared_table:
+                with span("shared_table.get"):
+                    rate = self.shared_table.get(currency_from, currency_to, self.client.name)
+                if rate and self._is_fresh(rate, cache_max_seconds):
+                    return rate
             rate = await self.cache.get(currency_from, currency_to, self.client.name)
-            if rate and rate.updated_at + timedelta(seconds=cache_max_seconds) >= datetime.utcnow():
+            if rate and self._is_fresh(rate, cache_max_seconds):
                 return rate
         rate = await self.client.get_direct_rate(currency_from, currency_to)
         await self.cache.set(rate)
         return rate
 
-    async def get_non_direct_rate(self, currency_from: str, currency_to: str) -> ExchangeRate:
-        rate = await self.client.get_non_direct_rate(currency_from, currency_to)
+    async def get_non_direct_rate(self, currency_from: str, currency_to: str, **kwargs) -> ExchangeRate:
+        cache_max_seconds = kwargs.get("cache_max_seconds")
+        if cache_max_seconds and self.shared_table:
+            with span("shared_table.get_snapshot"):
+                shared_rates = self.shared_table.get_snapshot(self.client.name)
+            if self._is_snapshot_fresh(shared_rates, cache_max_seconds):
+                # Published by the leader, no need to download every ticker or to write to Redis in each worker
+                return self.client.find_non_direct_rate(shared_rates, currency_from, currency_to)
+        rates = self._snapshot
+        if not (cache_max_seconds and self._is_snapshot_fresh(rates, cache_max_seconds)):
+            rates = await self._fetch_snapshot()
+        rate = self.client.find_non_direct_rate(rates, currency_from, currency_to)
         await self.cache.set(rate)
         return rate
+
+    async def refresh_snapshot(self) -> list[ExchangeRate]:
+        """Fetch every rate listed on the exchange and warm the cache with it"""
+        rates = await self._fetch_snapshot()
+        await self.warm_cache(rates)
+        return rates
+
+    def preload_snapshot(self, rates: list[ExchangeRate]) -> None:
+        """Seed the snapshot on start, so the first non-direct requests don't download every ticker"""
+        if not self._snapshot:
+            self._snapshot = rates
+
+    async def warm_cache(self, rates: list[ExchangeRate]) -> None:
+        await self.cache.set_snapshot(self.client.name, rates)
+
+    async def _fetch_snapshot(self) -> list[ExchangeRate]:
+        """Concurrent requests share a single download of every ticker"""
+        if self._fetch_snapshot_task is None:
+            self._fetch_snapshot_task = asyncio.create_task(self._download_snapshot())
+            self._fetch_snapshot_task.add_done_callback(self._on_fetch_snapshot_done)
+        return await asyncio.shield(self._fetch_snapshot_task)  # A cancelled request doesn't cancel the others
+
+    async def _download_snapshot(self) -> list[ExchangeRate]:
+        rates = self._snapshot = await self.client.get_all_rates()
+        if self.warm_cache_on_fetch:
+            self._warm_cache_in_background(rates)
+        return rates
+
+    def _on_fetch_snapshot_done(self, task: asyncio.Task) -> None:
+        self._fetch_snapshot_task = None
+        if not task.cancelled():
+            task.exception()  # Retrieved here too, in case every waiting request was cancelled
+
+    def _warm_cache_in_background(self, rates: list[ExchangeRate]) -> None:
+        """Bulk writes are kept out of the request. While one is running newer snapshots are not written"""
+        if self._warm_cache_tasks:
+            return
+        # Not part of the request's trace, which may be exported before the task is done
+        task = asyncio.create_task(self.warm_cache(rates), context=contextvars.Context())
+        self._warm_cache_tasks.add(task)
+        task.add_done_callback(self._on_warm_cache_done)
+
+    def _on_warm_cache_done(self, task: asyncio.Task) -> None:
+        self._warm_cache_tasks.discard(task)
+        if not task.cancelled() and (exc := task.exception()):
+            logger.warning("Failed to warm %s cache: %r", self.client.name, exc)
+
+    @classmethod
+    def _is_snapshot_fresh(cls, rates: list[ExchangeRate], cache_max_seconds: int) -> bool:
+        return bool(rates) and cls._is_fresh(rates[0], cache_max_seconds)  # The first rate of a snapshot is the oldest
+
+    @staticmethod
+    def _is_fresh(rate: ExchangeRate, cache_max_seconds: int) -> bool:
+        return rate.updated_at + timedelta(seconds=cache_max_seconds) >= datetime.utcnow()
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from decimal import Decimal
 from http import HTTPStatus
@@ -9,6 +9,7 @@ from aiohttp.client import _RequestContextManager, ClientError, ClientSession
 
 from converter.errors import ExchangeIsNotAvailable, ExchangeNotFound
 from converter.models import Exchange, ExchangeRate
+from tracing import cpu_span, span
 
 
 class ExchangeClient(ABC):
@@ -17,7 +18,7 @@ class ExchangeClient(ABC):
         pass
 
     @abstractmethod
-    async def get_non_direct_rate(self, currency_from: str, currency_to: str) -> ExchangeRate:
+    async def get_non_direct_rate(self, currency_from: str, currency_to: str, **kwargs) -> ExchangeRate:
         pass
 
 
@@ -27,14 +28,15 @@ class ExchangeClientHTTPBase(ExchangeClient):
     async def get_direct_rate(self, currency_from: str, currency_to: str, **kwargs) -> ExchangeRate:
         reversed_rate = kwargs.get("reversed_rate")
         try:
-            async with self._make_get_rate_request(currency_from, currency_to) as response:
-                if response.status == HTTPStatus.BAD_REQUEST:
-                    raise ExchangeNotFound()
-                if response.status != HTTPStatus.OK:
-                    raise ExchangeIsNotAvailable()
-                data = await response.json()
-                rate = self._process_rate_data(data, currency_from, currency_to)
-                return rate.reversed if reversed_rate else rate
+            with span("exchange.get_rate", exchange=self.name, symbol=f"{currency_from}:{currency_to}"):
+                async with self._make_get_rate_request(currency_from, currency_to) as response:
+                    if response.status == HTTPStatus.BAD_REQUEST:
+                        raise ExchangeNotFound()
+                    if response.status != HTTPStatus.OK:
+                        raise ExchangeIsNotAvailable()
+                    data = await response.json()
+            rate = self._process_rate_data(data, currency_from, currency_to)
+            return rate.reversed if reversed_rate else rate
         except ExchangeNotFound:
             if reversed_rate:
                 raise
@@ -42,8 +44,37 @@ class ExchangeClientHTTPBase(ExchangeClient):
         except ClientError as exc:
             raise ExchangeIsNotAvailable() from exc
 
-    async def get_non_direct_rate(self, currency_from: str, currency_to: str) -> ExchangeRate:
-        related_rates = await self._get_related_rates(currency_from, currency_to)
+    async def get_non_direct_rate(self, currency_from: str, currency_to: str, **kwargs) -> ExchangeRate:
+        rates = await self.get_all_rates()
+        return self.find_non_direct_rate(rates, currency_from, currency_to)
+
+    async def warm_up(self) -> None:
+        """Open a connection to the exchange, so the first requests don't pay for TCP and TLS handshakes"""
+        try:
+            async with self._make_ping_request() as response:
+                await response.read()
+        except ClientError as exc:
+            raise ExchangeIsNotAvailable() from exc
+
+    async def get_all_rates(self) -> list[ExchangeRate]:
+        """Get a snapshot of every pair listed on the exchange"""
+        try:
+            with span("exchange.get_all_rates", exchange=self.name):
+                async with self._make_get_all_rates_request() as response:
+                    if response.status != HTTPStatus.OK:
+                        raise ExchangeIsNotAvailable()
+                    data = await response.json()
+        except ClientError as exc:
+            raise ExchangeIsNotAvailable() from exc
+        with cpu_span("exchange.process_all_rates_data", exchange=self.name):
+            return self._process_all_rates_data(data)
+
+    def find_non_direct_rate(self, rates: list[ExchangeRate], currency_from: str, currency_to: str) -> ExchangeRate:
+        with cpu_span("exchange.find_non_direct_rate", exchange=self.name, rates=len(rates)):
+            return self._find_non_direct_rate(rates, currency_from, currency_to)
+
+    def _find_non_direct_rate(self, rates: list[ExchangeRate], currency_from: str, currency_to: str) -> ExchangeRate:
+        related_rates = self._get_related_rates(rates, currency_from, currency_to)
         from_intermediate_mapping = {
             rate.currency_to: rate for rate in related_rates if rate.currency_from == currency_from
         }
@@ -66,17 +97,21 @@ class ExchangeClientHTTPBase(ExchangeClient):
             raise ExchangeNotFound()
         return best_rate
 
-    async def _get_related_rates(self, currency_from: str, currency_to: str) -> list[ExchangeRate]:
+    @staticmethod
+    def _get_related_rates(rates: list[ExchangeRate], currency_from: str, currency_to: str) -> list[ExchangeRate]:
         """Get all <currency_from> to <any currency> and <any currency> to <currency_to> rates"""
-        try:
-            async with self._make_get_all_rates_request() as response:
-                if response.status != HTTPStatus.OK:
-                    raise ExchangeIsNotAvailable()
-                data = await response.json()
-                rates = self._process_all_rates_data(data, currency_from, currency_to)
-                return rates
-        except ClientError as exc:
-            raise ExchangeIsNotAvailable() from exc
+        related_rates = []
+        for rate in rates:
+            if not ({rate.currency_from, rate.currency_to} & {currency_from, currency_to}):
+                continue
+            if currency_from == rate.currency_to or currency_to == rate.currency_from:
+                rate = rate.reversed
+            related_rates.append(rate)
+        return related_rates
+
+    @abstractmethod
+    def _make_ping_request(self) -> _RequestContextManager:
+        pass
 
     @abstractmethod
     def _make_get_rate_request(self, currency_from: str, currency_to: str) -> _RequestContextManager:
@@ -91,7 +126,7 @@ class ExchangeClientHTTPBase(ExchangeClient):
         pass
 
     @abstractmethod
-    def _process_all_rates_data(self, data: dict, currency_from: str, currency_to: str) -> list[ExchangeRate]:
+    def _process_all_rates_data(self, data: dict) -> list[ExchangeRate]:
         pass
 
 
@@ -100,6 +135,36 @@ class BinanceExchangeClient(ExchangeClientHTTPBase):
     name = Exchange.BINANCE
     session: ClientSession
     BASE_URL = "https://api4.binance.com"
+    # Binance symbols have no separator, so <symbol> -> (<base asset>, <quote asset>) is loaded from exchange info
+    _symbols: dict[str, tuple[str, str] | None] = field(default_factory=dict, init=False, repr=False)
+
+    async def warm_up(self) -> None:
+        await super().warm_up()
+        if not self._symbols:
+            await self._load_symbols()
+
+    async def get_all_rates(self) -> list[ExchangeRate]:
+        if not self._symbols:
+            await self._load_symbols()
+        return await super().get_all_rates()
+
+    async def _load_symbols(self) -> None:
+        try:
+            async with self.session.get(f"{self.BASE_URL}/api/v3/exchangeInfo") as response:
+                if response.status != HTTPStatus.OK:
+                    raise ExchangeIsNotAvailable()
+                data = await response.json()
+        except ClientError as exc:
+            raise ExchangeIsNotAvailable() from exc
+        self._symbols = {
+            raw_symbol["symbol"]: (
+                (raw_symbol["baseAsset"], raw_symbol["quoteAsset"]) if raw_symbol["status"] == "TRADING" else None
+            )
+            for raw_symbol in data["symbols"]
+        }
+
+    def _make_ping_request(self) -> _RequestContextManager:
+        return self.session.get(f"{self.BASE_URL}/api/v3/ping")
 
     def _make_get_rate_request(self, currency_from: str, currency_to: str) -> _RequestContextManager:
         return self.session.get(
@@ -119,21 +184,20 @@ class BinanceExchangeClient(ExchangeClientHTTPBase):
     def _make_get_all_rates_request(self) -> _RequestContextManager:
         return self.session.get(f"{self.BASE_URL}/api/v3/ticker/price")
 
-    def _process_all_rates_data(self, data: dict, currency_from: str, currency_to: str) -> list[ExchangeRate]:
+    def _process_all_rates_data(self, data: dict) -> list[ExchangeRate]:
         rates = []
+        has_new_symbols = False
         for raw_rate in data:
             symbol: str = raw_rate["symbol"]
-            if "DOWN" in symbol or "UP" in symbol:  # Breaks calculations
+            if symbol not in self._symbols:
+                has_new_symbols = True
                 continue
-            if symbol.startswith(currency_from):
-                rate = self._process_rate_data(raw_rate, currency_from, symbol.removeprefix(currency_from))
-            elif symbol.endswith(currency_from):
-                rate = self._process_rate_data(raw_rate, symbol.removesuffix(currency_from), currency_from).reversed
-            elif symbol.startswith(currency_to):
-                rate = self._process_rate_data(raw_rate, currency_to, symbol.removeprefix(currency_to)).reversed
-            else:
-                rate = self._process_rate_data(raw_rate, symbol.removesuffix(currency_to), currency_to)
-            rates.append(rate)
+            currencies = self._symbols[symbol]
+            if currencies is None or not Decimal(raw_rate["price"]):  # Not trading
+                continue
+            rates.append(self._process_rate_data(raw_rate, *currencies))
+        if has_new_symbols:
+            self._symbols.clear()  # Listed after symbols were loaded, reload them on the next snapshot
         return rates
 
 
@@ -143,6 +207,9 @@ class KuCoinExchangeClient(ExchangeClientHTTPBase):
     session: ClientSession
     BASE_URL = "https://api.kucoin.com"
 
+    def _make_ping_request(self) -> _RequestContextManager:
+        return self.session.get(f"{self.BASE_URL}/api/v1/timestamp")
+
     def _make_get_rate_request(self, currency_from: str, currency_to: str) -> _RequestContextManager:
         return self.session.get(
             f"{self.BASE_URL}/api/v1/market/orderbook/level1",
@@ -163,20 +230,19 @@ class KuCoinExchangeClient(ExchangeClientHTTPBase):
     def _make_get_all_rates_request(self) -> _RequestContextManager:
         return self.session.get(f"{self.BASE_URL}/api/v1/market/allTickers")
 
-    def _process_all_rates_data(self, data: dict, currency_from: str, currency_to: str) -> list[ExchangeRate]:
+    def _process_all_rates_data(self, data: dict) -> list[ExchangeRate]:
         rates = []
         for raw_rate in data["data"]["ticker"]:
-            rate_from, rate_to = raw_rate["symbol"].split("-")
-            if not ({rate_from, rate_to} & {currency_to, currency_from}):
+            if not raw_rate["last"] or not Decimal(raw_rate["last"]):  # Not trading
                 continue
-            rate = ExchangeRate(
-                currency_from=rate_from,
-                currency_to=rate_to,
-                exchange=self.name,
-                rate=Decimal(raw_rate["last"]),
-                updated_at=datetime.utcnow(),
+            rate_from, rate_to = raw_rate["symbol"].split("-")
+            rates.append(
+                ExchangeRate(
+                    currency_from=rate_from,
+                    currency_to=rate_to,
+                    exchange=self.name,
+                    rate=Decimal(raw_rate["last"]),
+                    updated_at=datetime.utcnow(),
+                )
             )
-            if currency_from == rate.currency_to or currency_to == rate.currency_from:
-                rate = rate.reversed
-            rates.append(rate)
         return rates
@@ -1,24 +1,42 @@
 from aiohttp import web
 
+from common import Priority, admission_control_middleware
 from converter.schemas import ConvertRequestSchema, ConvertResponseSchema
 from converter.service import ConvertService
+from tracing import cpu_span, span
 
-convert_app = web.Application()
+convert_app = web.Application(middlewares=[admission_control_middleware])
 routes = web.RouteTableDef()
 
 
+async def get_request_data(request: web.Request) -> ConvertRequestSchema:
+    """The body is parsed once, by the admission priority getter or by the handler if there is no getter"""
+    if "request_data" not in request:
+        body = await request.text()
+        with cpu_span("convert.validation"):
+            request["request_data"] = ConvertRequestSchema.model_validate_json(body)
+    return request["request_data"]
+
+
+async def get_admission_priority(request: web.Request) -> Priority:
+    """Requests that may be served from the cache are admitted first, the others need upstream calls"""
+    request_data = await get_request_data(request)
+    return Priority.HIGH if request_data.cache_max_seconds else Priority.LOW
+
+
 @routes.post("")
 async def convert_currencies(request: web.Request) -> web.Response:
     service: ConvertService = request.config_dict["convert_service"]
-    request_data = ConvertRequestSchema.model_validate_json(await request.text())
-
-    conversion = await service.convert(
-        request_data.currency_from,
-        request_data.currency_to,
-        request_data.exchange,
-        request_data.amount,
-        request_data.cache_max_seconds,
-    )
+    request_data = await get_request_data(request)
+
+    with span("convert.service"):
+        conversion = await service.convert(
+            request_data.currency_from,
+            request_data.currency_to,
+            request_data.exchange,
+            request_data.amount,
+            request_data.cache_max_seconds,
+        )
 
     response_data = ConvertResponseSchema(
         currency_from=conversion.currency_from,
@@ -31,4 +49,5 @@ async def convert_currencies(request: web.Request) -> web.Response:
     return web.json_response(text=response_data.model_dump_json())
 
 
+convert_app["admission_priority_getter"] = get_admission_priority
 convert_app.add_routes(routes)
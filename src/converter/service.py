@@ -1,7 +1,9 @@
+from collections.abc import Mapping
+from contextlib import nullcontext
 from dataclasses import dataclass
 from decimal import Decimal
 
-from common import ApplicationError
+from common import AdmissionLimiter, ApplicationError, Priority
 from converter.client import ExchangeClient
 from converter.errors import ExchangeError, ExchangeIsNotAvailable, ExchangeNotFound
 from converter.models import Conversion, Exchange, ExchangeRate
@@ -9,7 +11,8 @@ from converter.models import Conversion, Exchange, ExchangeRate
 
 @dataclass
 class ConvertService:
-    exchange_clients: dict[Exchange, ExchangeClient]
+    exchange_clients: Mapping[Exchange, ExchangeClient]
+    non_direct_limiter: AdmissionLimiter | None = None  # Non-direct rates download every ticker of an exchange
 
     async def convert(
         self,
@@ -23,7 +26,9 @@ class ConvertService:
 
         rate, errors = await self._get_direct_rate(exchanges, convert_from, convert_to, cache_max_seconds)
         if not rate:
-            rate, errors = await self._get_non_direct_rate(exchanges, convert_from, convert_to)
+            priority = Priority.HIGH if cache_max_seconds else Priority.LOW  # May be served from a fresh snapshot
+            async with self.non_direct_limiter.admit(priority) if self.non_direct_limiter else nullcontext():
+                rate, errors = await self._get_non_direct_rate(exchanges, convert_from, convert_to, cache_max_seconds)
         if not rate:
             self._handle_errors(errors)
             return  # type: ignore # Unreachable
@@ -53,13 +58,14 @@ class ConvertService:
         exchanges: list[Exchange],
         convert_from: str,
         convert_to: str,
+        cache_max_seconds: int | None,
     ) -> tuple[ExchangeRate | None, list[Exception]]:
         rate = None
         errors: list[Exception] = []
         for exchange in exchanges:
             client = self.exchange_clients[exchange]
             try:
-                rate = await client.get_non_direct_rate(convert_from, convert_to)
+                rate = await client.get_non_direct_rate(convert_from, convert_to, cache_max_seconds=cache_max_seconds)
             except ExchangeError as exc:
                 errors.append(exc)
             if rate:
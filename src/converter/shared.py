@@ -0,0 +1,175 @@
+import fcntl
+import json
+import mmap
+import os
+import socket
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError, RedisError
+
+from converter.models import Exchange, ExchangeRate
+
+# <sequence><payload length> followed by JSON payload: {<exchange>: {"<currency from>:<currency to>": [<rate>, <ts>]}}
+HEADER = struct.Struct("<QQ")
+SEQUENCE = struct.Struct("<Q")
+LENGTH = struct.Struct("<Q")
+LENGTH_OFFSET = SEQUENCE.size
+READ_ATTEMPTS = 100
+
+
+class SharedRateTableSettings(BaseSettings):
+    enabled: bool = False
+    path: str = "/dev/shm/crypto-exchange-rates"
+    size: int = 16 * 1024 * 1024
+    lock_timeout: int = 30
+
+    model_config = SettingsConfigDict(env_prefix="shared_rate_table_")
+
+    def check_refresh_interval(self, refresh_interval: int | None) -> None:
+        """The leader must renew the lock before it expires, otherwise leadership flips between workers"""
+        if not refresh_interval:
+            raise ValueError("Shared rate table requires SNAPSHOT_REFRESH_INTERVAL to be set")
+        if self.lock_timeout <= refresh_interval:
+            raise ValueError("SHARED_RATE_TABLE_LOCK_TIMEOUT must be longer than SNAPSHOT_REFRESH_INTERVAL")
+
+    @property
+    def lock_name(self) -> str:
+        return f"shared-rate-table:{socket.gethostname()}"  # Shared memory is per host, so is the leader
+
+
+@dataclass
+class SharedRateTable:
+    """
+    Rate table in a memory-mapped file shared by all workers on the host.
+    Written by a single leader and read without locks or syscalls using a seqlock:
+    the sequence is odd while the payload is being written and readers retry if it changed while they were reading.
+    """
+
+    fd: int
+    buffer: mmap.mmap
+    _sequence: int = field(default=0, init=False, repr=False)
+    _table: dict[str, dict[str, list]] = field(default_factory=dict, init=False, repr=False)
+    _snapshots: dict[str, list[ExchangeRate]] = field(default_factory=dict, init=False, repr=False)
+
+    @classmethod
+    def open(cls, path: str, size: int) -> "SharedRateTable":
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        return cls(fd, mmap.mmap(fd, size))
+
+    def close(self) -> None:
+        self.buffer.close()
+        os.close(self.fd)
+
+    def get(self, currency_from: str, currency_to: str, exchange: Exchange) -> ExchangeRate | None:
+        rates = self._read().get(exchange)
+        if not rates:
+            return None
+        if raw_rate := rates.get(f"{currency_from}:{currency_to}"):
+            return self._load(raw_rate, currency_from, currency_to, exchange)
+        if raw_rate := rates.get(f"{currency_to}:{currency_from}"):
+            return self._load(raw_rate, currency_to, currency_from, exchange).reversed
+        return None
+
+    def get_snapshot(self, exchange: Exchange) -> list[ExchangeRate]:
+        """Rates of all pairs published for the exchange. Built once per published table"""
+        rates = self._read().get(exchange)
+        if not rates:
+            return []
+        if exchange not in self._snapshots:
+            self._snapshots[exchange] = snapshot = []
+            for pair, raw_rate in rates.items():
+                currency_from, currency_to = pair.split(":")
+                snapshot.append(self._load(raw_rate, currency_from, currency_to, exchange))
+        return self._snapshots[exchange]
+
+    def has_rates(self, exchange: Exchange) -> bool:
+        return bool(self._read().get(exchange))
+
+    def publish(self, snapshots: dict[Exchange, list[ExchangeRate]]) -> None:
+        """Replace the rates of the given exchanges. Rates of other exchanges are kept as they are"""
+        table = self._read() | {
+            exchange: {
+                f"{rate.currency_from}:{rate.currency_to}": [str(rate.rate), int(rate.updated_at.timestamp())]
+                for rate in rates
+            }
+            for exchange, rates in snapshots.items()
+        }
+        payload = json.dumps(table, separators=(",", ":")).encode()
+        if HEADER.size + len(payload) > len(self.buffer):
+            raise ValueError(f"Rate table of {len(payload)} bytes doesn't fit into the shared memory")
+        fcntl.flock(self.fd, fcntl.LOCK_EX)  # Guards against two leaders writing at once during failover
+        try:
+            # The sequence stays odd if a writer died mid-write, the next write starts from it to recover
+            sequence = SEQUENCE.unpack_from(self.buffer)[0] | 1
+            SEQUENCE.pack_into(self.buffer, 0, sequence)
+            LENGTH.pack_into(self.buffer, LENGTH_OFFSET, len(payload))
+            self.buffer[HEADER.size : HEADER.size + len(payload)] = payload
+            SEQUENCE.pack_into(self.buffer, 0, sequence + 1)  # Published last, after the length and the payload
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def _read(self) -> dict[str, dict[str, list]]:
+        """Get the latest consistent table. The parsed table is reused until the leader publishes a new one"""
+        for _ in range(READ_ATTEMPTS):
+            sequence, length = HEADER.unpack_from(self.buffer)
+            if sequence == self._sequence:
+                break
+            if sequence % 2:
+                continue
+            payload = self.buffer[HEADER.size : HEADER.size + length]
+            if SEQUENCE.unpack_from(self.buffer)[0] != sequence:
+                continue
+            try:
+                table = json.loads(payload)
+            except ValueError:
+                continue  # Torn read
+            self._table = table
+            self._snapshots = {}
+            self._sequence = sequence
+            break
+        return self._table  # Stale table if the writer kept it busy, rates are checked for freshness anyway
+
+    @staticmethod
+    def _load(raw_rate: list, currency_from: str, currency_to: str, exchange: Exchange) -> ExchangeRate:
+        rate, updated_at = raw_rate
+        return ExchangeRate(
+            currency_from=currency_from,
+            currency_to=currency_to,
+            exchange=exchange,
+            rate=Decimal(rate),
+            updated_at=datetime.fromtimestamp(updated_at),
+        )
+
+
+@dataclass
+class LeaderElection:
+    """Redis lock based election. The lock expires if the leader dies, so another worker takes over"""
+
+    lock: Lock
+    is_leader: bool = False
+
+    async def ensure(self) -> bool:
+        try:
+            if self.is_leader:
+                await self.lock.reacquire()
+            else:
+                self.is_leader = await self.lock.acquire(blocking=False)
+        except (LockError, RedisError):
+            self.is_leader = False
+        return self.is_leader
+
+    async def resign(self) -> None:
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        try:
+            await self.lock.release()
+        except (LockError, RedisError):
+            pass
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from converter.cache import ExchangeClientCacheProxy
+from converter.errors import ExchangeError
+from converter.models import Exchange, ExchangeRate
+from converter.shared import LeaderElection, SharedRateTable
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotSettings(BaseSettings):
+    refresh_interval: int | None = None  # Seconds. Scheduled refresh is disabled if not set
+    file: str | None = None  # Local copy of the latest snapshots used for warm start
+
+    model_config = SettingsConfigDict(env_prefix="snapshot_")
+
+
+@dataclass
+class SnapshotFile:
+    """Latest snapshots persisted on disk, so a worker can warm up even if Redis is empty"""
+
+    path: str
+
+    def save(self, snapshots: dict[Exchange, list[ExchangeRate]]) -> None:
+        raw_snapshots = self._read() | {
+            exchange: [
+                [rate.currency_from, rate.currency_to, str(rate.rate), int(rate.updated_at.timestamp())]
+                for rate in rates
+            ]
+            for exchange, rates in snapshots.items()
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(raw_snapshots, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)  # Readers never see a partially written file
+
+    def load(self) -> dict[Exchange, list[ExchangeRate]]:
+        return {
+            Exchange(exchange): [
+                ExchangeRate(
+                    currency_from=currency_from,
+                    currency_to=currency_to,
+                    exchange=Exchange(exchange),
+                    rate=Decimal(rate),
+                    updated_at=datetime.fromtimestamp(updated_at),
+                )
+                for currency_from, currency_to, rate, updated_at in raw_rates
+            ]
+            for exchange, raw_rates in self._read().items()
+            if exchange in list(Exchange)  # Skip exchanges that are not supported anymore
+        }
+
+    def _read(self) -> dict[str, list[list]]:
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+
+@dataclass
+class SnapshotRefresher:
+    """
+    Periodically warms the cache with full exchange snapshots instead of fetching rates pair by pair.
+    With leader election only the leader refreshes snapshots and publishes them to the shared rate table.
+    """
+
+    exchange_clients: dict[Exchange, ExchangeClientCacheProxy]
+    interval: int
+    shared_table: SharedRateTable | None = None
+    leader_election: LeaderElection | None = None
+    snapshot_file: SnapshotFile | None = None
+
+    async def refresh(self) -> dict[Exchange, list[ExchangeRate]]:
+        results = await asyncio.gather(
+            *(client.refresh_snapshot() for client in self.exchange_clients.values()),
+            return_exceptions=True,
+        )
+        snapshots = {}
+        for exchange, result in zip(self.exchange_clients, results):
+            if isinstance(result, ExchangeError):
+                logger.warning("Failed to refresh %s snapshot: %s", exchange, result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                snapshots[exchange] = result
+        return snapshots
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if self.leader_election is None or await self.leader_election.ensure():
+                    snapshots = await self.refresh()
+                    if self.shared_table:
+                        self.shared_table.publish(snapshots)
+                    if self.snapshot_file:
+                        await asyncio.to_thread(self.snapshot_file.save, snapshots)
+            except Exception:
+                logger.exception("Unexpected error while refreshing snapshots")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from converter.cache import ExchangeClientCacheProxy, ExchangeRateCache
+from converter.models import Exchange, ExchangeRate
+from converter.shared import SharedRateTable
+from converter.snapshot import SnapshotFile
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmUp:
+    """
+    Prepares a freshly started worker before it reports readiness:
+    preloads the latest snapshots from Redis or the snapshot file and opens connections to the exchanges.
+    """
+
+    exchange_clients: dict[Exchange, ExchangeClientCacheProxy]
+    cache: ExchangeRateCache
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    shared_table: SharedRateTable | None = None
+    snapshot_file: SnapshotFile | None = None
+    timeout: float = 10  # Report readiness anyway if exchanges or Redis are too slow to respond
+
+    async def run(self) -> None:
+        try:
+            async with asyncio.timeout(self.timeout):
+                results = await asyncio.gather(
+                    self._preload_snapshots(),
+                    *(client.client.warm_up() for client in self.exchange_clients.values()),
+                    return_exceptions=True,
+                )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning("Warm up step failed: %r", result)
+        except TimeoutError:
+            logger.warning("Warm up timed out after %s seconds", self.timeout)
+        self.ready.set()
+
+    async def _preload_snapshots(self) -> None:
+        """
+        Seed every exchange client with the latest snapshot from Redis, or from the snapshot file if Redis has none,
+        so the first non-direct requests don't download every ticker. Empty Redis and shared rate table are filled too.
+        """
+        snapshots: dict[Exchange, list[ExchangeRate]] = {}
+        missing_exchanges = []
+        for exchange in self.exchange_clients:
+            if rates := await self.cache.get_snapshot(exchange):
+                snapshots[exchange] = rates
+            else:
+                missing_exchanges.append(exchange)
+        if missing_exchanges and self.snapshot_file:
+            file_snapshots = await asyncio.to_thread(self.snapshot_file.load)
+            for exchange in missing_exchanges:
+                if file_rates := file_snapshots.get(exchange):
+                    await self.exchange_clients[exchange].warm_cache(file_rates)
+                    snapshots[exchange] = file_rates
+        for exchange, rates in snapshots.items():
+            self.exchange_clients[exchange].preload_snapshot(rates)
+        if self.shared_table:
+            shared_table = self.shared_table
+            # Don't overwrite rates already published by the leader, they are fresher
+            if missing_snapshots := {
+                exchange: rates for exchange, rates in snapshots.items() if not shared_table.has_rates(exchange)
+            }:
+                shared_table.publish(missing_snapshots)
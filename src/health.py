@@ -0,0 +1,16 @@
+from http import HTTPStatus
+
+from aiohttp import web
+
+health_app = web.Application()
+routes = web.RouteTableDef()
+
+
+@routes.get("/ready")
+async def ready(request: web.Request) -> web.Response:
+    if not request.config_dict["warm_up"].ready.is_set():
+        return web.json_response({"status": "warming up"}, status=HTTPStatus.SERVICE_UNAVAILABLE)
+    return web.json_response({"status": "ready"})
+
+
+health_app.add_routes(routes)
@@ -0,0 +1,224 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Any, Self
+
+from aiohttp import web
+from aiohttp.typedefs import Handler
+from aiohttp.web_request import Request
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"  # "timing" for stage-by-stage breakdown, "cpu" to log a CPU profile of sync stages as well
+PROFILE_STATS_LINES = 30
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+_current_profiler: ContextVar[cProfile.Profile | None] = ContextVar("current_profiler", default=None)
+
+
+class TracingSettings(BaseSettings):
+    enabled: bool = False
+    sample_rate: float = 0.01
+    profiling_enabled: bool = False  # The profile header is ignored unless enabled
+    profile_sample_rate: float = 0.1  # Share of requests with the profile header that are actually profiled
+    max_spans: int = 10_000
+
+    model_config = SettingsConfigDict(env_prefix="tracing_")
+
+
+@dataclass
+class Span:
+    """Finished spans follow the OpenTelemetry data model and can be exported as OTLP JSON"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    attributes: dict[str, Any]
+    trace: list["Span"] = field(repr=False, compare=False)  # Finished spans of the whole trace
+    start_time_unix_nano: int = 0
+    end_time_unix_nano: int = 0
+    _token: Token | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __enter__(self) -> Self:
+        self._token = _current_span.set(self)
+        self.start_time_unix_nano = time.time_ns()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.end_time_unix_nano = time.time_ns()
+        if exc_type:
+            self.attributes["error.type"] = exc_type.__name__
+        if self._token:
+            _current_span.reset(self._token)
+        self.trace.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1_000_000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        otlp_span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_time_unix_nano),
+            "endTimeUnixNano": str(self.end_time_unix_nano),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}} for key, value in self.attributes.items()
+            ],
+        }
+        if self.parent_span_id:
+            otlp_span["parentSpanId"] = self.parent_span_id
+        return otlp_span
+
+
+class _NoopSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *args: object) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes: Any) -> AbstractContextManager[Span | None]:
+    """Child span of the current one. Outside of a trace it's a shared no-op, so untraced requests pay almost nothing"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, _generate_id(64), parent.span_id, attributes, parent.trace)
+
+
+@contextmanager
+def cpu_span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """
+    Span of a synchronous, CPU-bound stage. Nothing else runs on the event loop meanwhile,
+    so it's the only code profiled for a request with a CPU profile, other requests don't land in its profile.
+    """
+    with span(name, **attributes) as current_span:
+        profiler = _current_profiler.get()
+        if profiler is None:
+            yield current_span
+            return
+        profiler.enable()
+        try:
+            yield current_span
+        finally:
+            profiler.disable()
+
+
+@dataclass
+class InMemorySpanExporter:
+    max_spans: int
+    spans: deque[Span] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.spans = deque(maxlen=self.max_spans)
+
+    def export(self, spans: list[Span]) -> None:
+        self.spans.extend(spans)
+
+    def get_finished_spans(self) -> list[Span]:
+        return list(self.spans)
+
+
+@dataclass
+class Tracer:
+    exporter: InMemorySpanExporter
+    enabled: bool
+    sample_rate: float
+    profiling_enabled: bool
+    profile_sample_rate: float
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        root = Span(name, _generate_id(128), _generate_id(64), None, attributes, [])
+        try:
+            with root:
+                yield root
+        finally:
+            self.exporter.export(root.trace)
+
+    @contextmanager
+    def profile_cpu(self) -> Iterator[cProfile.Profile]:
+        """The profiler is only enabled within CPU spans of the request, see cpu_span"""
+        profiler = cProfile.Profile()
+        token = _current_profiler.set(profiler)
+        try:
+            yield profiler
+        finally:
+            _current_profiler.reset(token)
+
+    @staticmethod
+    def is_sampled(rate: float) -> bool:
+        return random.random() < rate
+
+
+def server_timing(spans: list[Span]) -> str:
+    """Stage-by-stage breakdown as a Server-Timing header value. Durations of spans with the same name are summed"""
+    durations: dict[str, float] = {}
+    for finished_span in spans:
+        durations[finished_span.name] = durations.get(finished_span.name, 0) + finished_span.duration_ms
+    return ", ".join(f"{name};dur={duration:.3f}" for name, duration in durations.items())
+
+
+def format_cpu_profile(profiler: cProfile.Profile) -> str:
+    profiler.create_stats()
+    if not profiler.stats:  # type: ignore[attr-defined]
+        return ""  # The request had no CPU spans
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_STATS_LINES)
+    return stream.getvalue()
+
+
+@web.middleware
+async def tracing_middleware(request: Request, handler: Handler) -> web.StreamResponse:
+    tracer: Tracer = request.config_dict["tracer"]
+    profile = request.headers.get(PROFILE_HEADER) if tracer.profiling_enabled else None
+    if profile and not tracer.is_sampled(tracer.profile_sample_rate):
+        profile = None
+    if not profile and not (tracer.enabled and tracer.is_sampled(tracer.sample_rate)):
+        return await handler(request)
+
+    with tracer.start_trace("http.request", **{"http.method": request.method, "http.target": request.path}) as root:
+        if profile == "cpu":
+            with tracer.profile_cpu() as profiler:
+                response = await handler(request)
+        else:
+            profiler = None
+            response = await handler(request)
+        root.set_attribute("http.status_code", response.status)
+    breakdown = server_timing(root.trace)
+    logger.info("Trace %s %s %s: %s", root.trace_id, request.method, request.path, breakdown)
+    if profiler and (cpu_profile := format_cpu_profile(profiler)):
+        logger.info("CPU profile of synchronous stages of trace %s:\n%s", root.trace_id, cpu_profile)
+    if profile:
+        response.headers["Server-Timing"] = breakdown
+        response.headers["X-Trace-Id"] = root.trace_id
+    return response
+
+
+def _generate_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
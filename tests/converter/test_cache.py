@@ -0,0 +1,182 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+
+from converter.cache import ExchangeClientCacheProxy, ExchangeRateCache
+from converter.models import Exchange
+from converter.shared import SharedRateTable
+from tracing import InMemorySpanExporter, Tracer
+
+
+class RedisPipelineFake:
+    def __init__(self, redis: "RedisFake") -> None:
+        self.redis = redis
+        self.commands: list = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.redis.data.__setitem__(key, value))
+
+    def delete(self, *keys):
+        self.commands.append(lambda: [self.redis.data.pop(key, None) for key in keys])
+
+    def sadd(self, key, *members):
+        self.commands.append(lambda: self.redis.data.setdefault(key, set()).update(members))
+
+    def expire(self, key, seconds):
+        pass
+
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+
+class RedisFake:
+    def __init__(self) -> None:
+        self.data: dict = {}
+
+    async def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def pipeline(self, transaction=True):
+        return RedisPipelineFake(self)
+
+
+@pytest.fixture
+def cache():
+    return ExchangeRateCache(RedisFake(), ttl=60)  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_set_snapshot_removes_delisted_pairs(cache: ExchangeRateCache, exchange_rate_factory):
+    # Arrange
+    kept_rate = exchange_rate_factory.build(currency_from="BTC", currency_to="USDT", exchange=Exchange.BINANCE)
+    delisted_rate = exchange_rate_factory.build(currency_from="OLD", currency_to="USDT", exchange=Exchange.BINANCE)
+    await cache.set_snapshot(Exchange.BINANCE, [kept_rate, delisted_rate])
+    assert await cache.get("USDT", "OLD", Exchange.BINANCE)
+    # Act
+    await cache.set_snapshot(Exchange.BINANCE, [kept_rate])
+    # Assert
+    assert await cache.get("OLD", "USDT", Exchange.BINANCE) is None
+    assert await cache.get("USDT", "OLD", Exchange.BINANCE) is None
+    assert await cache.get("BTC", "USDT", Exchange.BINANCE)
+    assert await cache.get("USDT", "BTC", Exchange.BINANCE)
+    assert await cache.get_snapshot(Exchange.BINANCE) == [kept_rate]
+
+
+@pytest.mark.asyncio
+async def test_non_direct_rate_reuses_fresh_snapshot_and_warms_cache_in_background(
+    cache: ExchangeRateCache, exchange_rate_factory
+):
+    # Arrange
+    rates = [
+        exchange_rate_factory.build(
+            currency_from=currency_from,
+            currency_to="USDT",
+            exchange=Exchange.BINANCE,
+            rate=Decimal(rate),
+            updated_at=datetime.utcnow() - timedelta(seconds=10),
+        )
+        for currency_from, rate in [("TRX", "0.1"), ("ADA", "0.5")]
+    ]
+    client = mock.AsyncMock()
+    client.name = Exchange.BINANCE
+    client.get_all_rates.return_value = rates
+    client.find_non_direct_rate = mock.Mock(side_effect=lambda *args: rates[0].merge(rates[1].reversed))
+    proxy = ExchangeClientCacheProxy(client, cache)
+    # Act
+    await proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=60)
+    await proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=60)
+    await asyncio.gather(*proxy._warm_cache_tasks)
+    await proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=5)
+    await asyncio.gather(*proxy._warm_cache_tasks)
+    # Assert
+    assert client.get_all_rates.await_count == 2
+    snapshot = await cache.get_snapshot(Exchange.BINANCE)
+    assert sorted(snapshot, key=lambda rate: rate.currency_from) == sorted(rates, key=lambda rate: rate.currency_from)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_non_direct_rates_share_single_snapshot_download(
+    cache: ExchangeRateCache, exchange_rate_factory
+):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE, updated_at=datetime.utcnow())
+
+    async def get_all_rates():
+        await asyncio.sleep(0.01)
+        return [rate]
+
+    client = mock.AsyncMock()
+    client.name = Exchange.BINANCE
+    client.get_all_rates.side_effect = get_all_rates
+    client.find_non_direct_rate = mock.Mock(return_value=rate)
+    proxy = ExchangeClientCacheProxy(client, cache)
+    # Act
+    await asyncio.gather(*(proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=60) for _ in range(10)))
+    await asyncio.gather(*proxy._warm_cache_tasks)
+    # Assert
+    assert client.get_all_rates.await_count == 1
+    assert proxy._fetch_snapshot_task is None
+
+
+@pytest.mark.asyncio
+async def test_non_direct_rate_uses_rates_published_by_leader(
+    tmp_path, cache: ExchangeRateCache, exchange_rate_factory
+):
+    # Arrange
+    rates = [
+        exchange_rate_factory.build(currency_from="TRX", currency_to="USDT", exchange=Exchange.BINANCE),
+        exchange_rate_factory.build(currency_from="ADA", currency_to="USDT", exchange=Exchange.BINANCE),
+    ]
+    for rate in rates:
+        rate.updated_at = datetime.utcnow()
+    shared_table = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    shared_table.publish({Exchange.BINANCE: rates})
+    client = mock.AsyncMock()
+    client.name = Exchange.BINANCE
+    client.find_non_direct_rate = mock.Mock(return_value=rates[0])
+    proxy = ExchangeClientCacheProxy(client, cache, shared_table)
+    # Act
+    await proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=60)
+    # Assert
+    client.get_all_rates.assert_not_awaited()
+    assert client.find_non_direct_rate.call_args.args[0] == shared_table.get_snapshot(Exchange.BINANCE)
+    assert not cache.redis.data  # type: ignore[attr-defined]
+    shared_table.close()
+
+
+@pytest.mark.asyncio
+async def test_background_cache_warming_is_not_part_of_request_trace(cache: ExchangeRateCache, exchange_rate_factory):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    client = mock.AsyncMock()
+    client.name = Exchange.BINANCE
+    client.get_all_rates.return_value = [rate]
+    client.find_non_direct_rate = mock.Mock(return_value=rate)
+    proxy = ExchangeClientCacheProxy(client, cache)
+    tracer = Tracer(InMemorySpanExporter(max_spans=100), True, 1, profiling_enabled=False, profile_sample_rate=0)
+    # Act
+    with tracer.start_trace("http.request") as root:
+        await proxy.get_non_direct_rate("TRX", "ADA")
+    await asyncio.gather(*proxy._warm_cache_tasks)
+    # Assert
+    assert await cache.get_snapshot(Exchange.BINANCE)
+    assert "redis.set_snapshot" not in {finished_span.name for finished_span in root.trace}
@@ -1,11 +1,14 @@
 from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
+from decimal import Decimal
 from http import HTTPStatus
 from unittest import mock
 
 import pytest
 
-from converter.client import ExchangeClientHTTPBase
+from converter.client import BinanceExchangeClient, ExchangeClientHTTPBase, KuCoinExchangeClient
+from converter.errors import ExchangeNotFound
+from converter.models import Exchange
 
 
 @dataclass
@@ -18,6 +21,11 @@ class AioHTTPResponseMock:
 
 
 class ExchangeClientMock(ExchangeClientHTTPBase):
+    name = Exchange.BINANCE
+
+    def _make_ping_request(self, *args, **kwargs):
+        pass
+
     def _make_get_rate_request(self, *args, **kwargs):
         pass
 
@@ -71,3 +79,76 @@ async def test_get_direct_rate_retries_if_not_found(exchange_client: ExchangeCli
     await exchange_client.get_direct_rate(rate.currency_from, rate.currency_to)
     # Assert
     assert exchange_client._make_get_rate_request.call_count == 2
+
+
+def test_find_non_direct_rate_uses_intermediate_currency(
+    exchange_client: ExchangeClientHTTPBase, exchange_rate_factory
+):
+    # Arrange
+    rates = [
+        exchange_rate_factory.build(
+            exchange=Exchange.BINANCE, currency_from="TRX", currency_to="USDT", rate=Decimal("0.1")
+        ),
+        exchange_rate_factory.build(
+            exchange=Exchange.BINANCE, currency_from="ADA", currency_to="USDT", rate=Decimal("0.5")
+        ),
+        exchange_rate_factory.build(
+            exchange=Exchange.BINANCE, currency_from="ETH", currency_to="BTC", rate=Decimal("0.05")
+        ),
+    ]
+    # Act
+    rate = exchange_client.find_non_direct_rate(rates, "TRX", "ADA")
+    # Assert
+    assert rate.currency_from == "TRX"
+    assert rate.currency_to == "ADA"
+    assert rate.rate == Decimal("0.2")
+    assert rate._intermediate == ["USDT"]
+
+
+def test_find_non_direct_rate_raises_if_not_found(exchange_client: ExchangeClientHTTPBase, exchange_rate_factory):
+    # Arrange
+    rates = [exchange_rate_factory.build(currency_from="ETH", currency_to="BTC")]
+    # Act & Assert
+    with pytest.raises(ExchangeNotFound):
+        exchange_client.find_non_direct_rate(rates, "TRX", "ADA")
+
+
+def test_kucoin_all_rates_skip_not_trading_pairs():
+    # Arrange
+    client = KuCoinExchangeClient(mock.Mock())
+    data = {
+        "data": {
+            "ticker": [
+                {"symbol": "BTC-USDT", "last": "60000"},
+                {"symbol": "OLD-USDT", "last": None},
+            ]
+        }
+    }
+    # Act
+    rates = client._process_all_rates_data(data)
+    # Assert
+    assert [(rate.currency_from, rate.currency_to, rate.rate) for rate in rates] == [("BTC", "USDT", Decimal("60000"))]
+
+
+def test_binance_all_rates_use_symbols_and_skip_not_trading_pairs():
+    # Arrange
+    client = BinanceExchangeClient(mock.Mock())
+    client._symbols = {"BTCUSDT": ("BTC", "USDT"), "OLDUSDT": None}
+    data = [{"symbol": "BTCUSDT", "price": "60000"}, {"symbol": "OLDUSDT", "price": "1"}]
+    # Act
+    rates = client._process_all_rates_data(data)
+    # Assert
+    assert [(rate.currency_from, rate.currency_to, rate.rate) for rate in rates] == [("BTC", "USDT", Decimal("60000"))]
+    assert client._symbols
+
+
+def test_binance_all_rates_reload_symbols_on_new_listing():
+    # Arrange
+    client = BinanceExchangeClient(mock.Mock())
+    client._symbols = {"BTCUSDT": ("BTC", "USDT")}
+    data = [{"symbol": "BTCUSDT", "price": "60000"}, {"symbol": "NEWUSDT", "price": "1"}]
+    # Act
+    rates = client._process_all_rates_data(data)
+    # Assert
+    assert len(rates) == 1
+    assert not client._symbols
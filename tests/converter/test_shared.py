@@ -0,0 +1,133 @@
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+from redis.exceptions import LockNotOwnedError
+
+from converter.models import Exchange
+from converter.shared import HEADER, SEQUENCE, LeaderElection, SharedRateTable, SharedRateTableSettings
+
+
+@pytest.fixture
+def shared_table(tmp_path):
+    table = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    yield table
+    table.close()
+
+
+def test_published_rates_are_visible_to_other_readers(tmp_path, shared_table: SharedRateTable, exchange_rate_factory):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE, rate=Decimal("2.5"))
+    reader = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    # Act
+    shared_table.publish({Exchange.BINANCE: [rate]})
+    result = reader.get(rate.currency_from, rate.currency_to, Exchange.BINANCE)
+    reversed_result = reader.get(rate.currency_to, rate.currency_from, Exchange.BINANCE)
+    # Assert
+    assert result == rate
+    assert reversed_result.rate == Decimal("0.4")
+    assert reader.get(rate.currency_from, rate.currency_to, Exchange.KUCOIN) is None
+    reader.close()
+
+
+def test_publish_keeps_other_exchanges(shared_table: SharedRateTable, exchange_rate_factory):
+    # Arrange
+    binance_rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    kucoin_rate = exchange_rate_factory.build(exchange=Exchange.KUCOIN)
+    # Act
+    shared_table.publish({Exchange.BINANCE: [binance_rate]})
+    shared_table.publish({Exchange.KUCOIN: [kucoin_rate]})
+    # Assert
+    assert shared_table.get(binance_rate.currency_from, binance_rate.currency_to, Exchange.BINANCE) == binance_rate
+    assert shared_table.get(kucoin_rate.currency_from, kucoin_rate.currency_to, Exchange.KUCOIN) == kucoin_rate
+
+
+def test_reader_keeps_previous_table_while_write_is_in_progress(
+    tmp_path, shared_table: SharedRateTable, exchange_rate_factory
+):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    reader = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    shared_table.publish({Exchange.BINANCE: [rate]})
+    assert reader.get(rate.currency_from, rate.currency_to, Exchange.BINANCE) == rate
+    # Act
+    sequence = SEQUENCE.unpack_from(shared_table.buffer)[0]
+    SEQUENCE.pack_into(shared_table.buffer, 0, sequence + 1)
+    shared_table.buffer[HEADER.size :] = bytes(len(shared_table.buffer) - HEADER.size)  # Payload is half-written
+    # Assert
+    assert reader.get(rate.currency_from, rate.currency_to, Exchange.BINANCE) == rate
+    reader.close()
+
+
+def test_publish_recovers_from_writer_that_died_mid_write(
+    tmp_path, shared_table: SharedRateTable, exchange_rate_factory
+):
+    # Arrange
+    old_rate = exchange_rate_factory.build(exchange=Exchange.BINANCE, rate=Decimal("1"))
+    new_rate = exchange_rate_factory.build(
+        currency_from=old_rate.currency_from, currency_to=old_rate.currency_to, exchange=Exchange.BINANCE
+    )
+    new_rate.rate = Decimal("2")
+    reader = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    shared_table.publish({Exchange.BINANCE: [old_rate]})
+    assert reader.get(old_rate.currency_from, old_rate.currency_to, Exchange.BINANCE) == old_rate
+    sequence = SEQUENCE.unpack_from(shared_table.buffer)[0]
+    SEQUENCE.pack_into(shared_table.buffer, 0, sequence + 1)  # The previous leader was killed during the write
+    # Act
+    shared_table.publish({Exchange.BINANCE: [new_rate]})
+    # Assert
+    assert SEQUENCE.unpack_from(shared_table.buffer)[0] % 2 == 0
+    assert reader.get(old_rate.currency_from, old_rate.currency_to, Exchange.BINANCE).rate == Decimal("2")
+    reader.close()
+
+
+@pytest.mark.asyncio
+async def test_leader_election_fails_over_when_lock_is_lost():
+    # Arrange
+    lock = mock.AsyncMock()
+    lock.acquire.return_value = True
+    lock.reacquire.side_effect = LockNotOwnedError()
+    election = LeaderElection(lock)
+    # Act & Assert
+    assert await election.ensure()
+    assert not await election.ensure()
+    assert not election.is_leader
+
+
+def test_reader_keeps_previous_table_if_payload_is_torn(tmp_path, shared_table: SharedRateTable, exchange_rate_factory):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    reader = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    shared_table.publish({Exchange.BINANCE: [rate]})
+    assert reader.get(rate.currency_from, rate.currency_to, Exchange.BINANCE) == rate
+    # Act
+    sequence = SEQUENCE.unpack_from(shared_table.buffer)[0]
+    shared_table.buffer[HEADER.size : HEADER.size + 4] = b'{"bi'  # New sequence, payload of another length
+    SEQUENCE.pack_into(shared_table.buffer, 0, sequence + 2)
+    # Assert
+    assert reader.get(rate.currency_from, rate.currency_to, Exchange.BINANCE) == rate
+    reader.close()
+
+
+def test_snapshot_is_built_from_published_rates(shared_table: SharedRateTable, exchange_rate_factory):
+    # Arrange
+    rates = exchange_rate_factory.batch(3, exchange=Exchange.KUCOIN)
+    shared_table.publish({Exchange.KUCOIN: rates})
+    # Act
+    snapshot = shared_table.get_snapshot(Exchange.KUCOIN)
+    # Assert
+    assert {(rate.currency_from, rate.currency_to, rate.rate) for rate in snapshot} == {
+        (rate.currency_from, rate.currency_to, rate.rate) for rate in rates
+    }
+    assert shared_table.get_snapshot(Exchange.KUCOIN) is snapshot
+    assert shared_table.get_snapshot(Exchange.BINANCE) == []
+
+
+@pytest.mark.parametrize("refresh_interval", [None, 30, 60])
+def test_lock_timeout_must_be_longer_than_refresh_interval(refresh_interval):
+    # Arrange
+    settings = SharedRateTableSettings(lock_timeout=30)
+    # Act & Assert
+    with pytest.raises(ValueError):
+        settings.check_refresh_interval(refresh_interval)
+    settings.check_refresh_interval(10)
@@ -0,0 +1,90 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+import pytest
+
+from converter.cache import ExchangeClientCacheProxy
+from converter.errors import ExchangeIsNotAvailable
+from converter.models import Exchange
+from converter.shared import SharedRateTable
+from converter.snapshot import SnapshotFile
+from converter.warmup import WarmUp
+
+
+def test_snapshot_file_round_trip_keeps_other_exchanges(tmp_path, exchange_rate_factory):
+    # Arrange
+    snapshot_file = SnapshotFile(str(tmp_path / "snapshot.json"))
+    binance_rate = exchange_rate_factory.build(exchange=Exchange.BINANCE, rate=Decimal("1.5"))
+    kucoin_rate = exchange_rate_factory.build(exchange=Exchange.KUCOIN, rate=Decimal("2.5"))
+    # Act
+    snapshot_file.save({Exchange.BINANCE: [binance_rate]})
+    snapshot_file.save({Exchange.KUCOIN: [kucoin_rate]})
+    snapshots = snapshot_file.load()
+    # Assert
+    assert snapshots == {Exchange.BINANCE: [binance_rate], Exchange.KUCOIN: [kucoin_rate]}
+
+
+def test_snapshot_file_is_empty_if_missing(tmp_path):
+    # Act & Assert
+    assert SnapshotFile(str(tmp_path / "snapshot.json")).load() == {}
+
+
+@pytest.mark.asyncio
+async def test_warm_up_restores_snapshot_from_file_and_becomes_ready(tmp_path, exchange_rate_factory):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    snapshot_file = SnapshotFile(str(tmp_path / "snapshot.json"))
+    snapshot_file.save({Exchange.BINANCE: [rate]})
+    cache = mock.AsyncMock()
+    cache.get_snapshot.return_value = []
+    client = mock.AsyncMock()
+    client.preload_snapshot = mock.Mock()
+    client.client.warm_up.side_effect = ExchangeIsNotAvailable()
+    warm_up = WarmUp({Exchange.BINANCE: client}, cache, snapshot_file=snapshot_file)
+    # Act
+    await warm_up.run()
+    # Assert
+    client.warm_cache.assert_awaited_once_with([rate])
+    client.preload_snapshot.assert_called_once_with([rate])
+    assert warm_up.ready.is_set()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_seeds_non_direct_snapshot_from_redis(exchange_rate_factory):
+    # Arrange
+    rates = [exchange_rate_factory.build(exchange=Exchange.BINANCE, updated_at=datetime.utcnow())]
+    cache = mock.AsyncMock()
+    cache.get_snapshot.return_value = rates
+    client = mock.AsyncMock()
+    client.name = Exchange.BINANCE
+    client.find_non_direct_rate = mock.Mock(return_value=rates[0])
+    proxy = ExchangeClientCacheProxy(client, cache)
+    warm_up = WarmUp({Exchange.BINANCE: proxy}, cache)
+    # Act
+    await warm_up.run()
+    await proxy.get_non_direct_rate("TRX", "ADA", cache_max_seconds=60)
+    # Assert
+    client.get_all_rates.assert_not_awaited()
+    cache.set_snapshot.assert_not_awaited()
+    assert client.find_non_direct_rate.call_args.args[0] == rates
+
+
+@pytest.mark.asyncio
+async def test_warm_up_publishes_listed_rates_from_redis_to_shared_table(tmp_path, exchange_rate_factory):
+    # Arrange
+    rate = exchange_rate_factory.build(exchange=Exchange.BINANCE)
+    shared_table = SharedRateTable.open(str(tmp_path / "rates"), 1024 * 1024)
+    cache = mock.AsyncMock()
+    cache.get_snapshot.return_value = [rate]
+    client = mock.AsyncMock()
+    client.preload_snapshot = mock.Mock()
+    warm_up = WarmUp({Exchange.BINANCE: client}, cache, shared_table=shared_table)
+    # Act
+    await warm_up.run()
+    # Assert
+    assert [
+        (published_rate.currency_from, published_rate.currency_to)
+        for published_rate in shared_table.get_snapshot(Exchange.BINANCE)
+    ] == [(rate.currency_from, rate.currency_to)]
+    shared_table.close()
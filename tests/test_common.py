@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from common import (
+    AdmissionLimiter,
+    ErrorHandlerRegistry,
+    Overloaded,
+    Priority,
+    admission_control_middleware,
+    error_handling_middleware,
+    overloaded_error_handler,
+)
+
+
+@pytest.mark.asyncio
+async def test_admission_limiter_rejects_when_queue_time_runs_out():
+    # Arrange
+    limiter = AdmissionLimiter(limit=1, queue_limit=10, queue_timeout=0.01, retry_after=3)
+    # Act & Assert
+    async with limiter.admit():
+        with pytest.raises(Overloaded) as exc_info:
+            async with limiter.admit():
+                pass
+    assert exc_info.value.retry_after == 3
+    assert not limiter._waiters
+    async with limiter.admit():
+        pass
+
+
+@pytest.mark.asyncio
+async def test_admission_limiter_admits_high_priority_first():
+    # Arrange
+    limiter = AdmissionLimiter(limit=1, queue_limit=10, queue_timeout=1, retry_after=1)
+    admitted = []
+
+    async def admit(priority: Priority) -> None:
+        async with limiter.admit(priority):
+            admitted.append(priority)
+
+    # Act
+    async with limiter.admit():
+        low = asyncio.create_task(admit(Priority.LOW))
+        high = asyncio.create_task(admit(Priority.HIGH))
+        await asyncio.sleep(0)
+    await asyncio.gather(low, high)
+    # Assert
+    assert admitted == [Priority.HIGH, Priority.LOW]
+    assert limiter._active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_limiter_releases_slot_of_waiter_cancelled_before_handover():
+    # Arrange
+    limiter = AdmissionLimiter(limit=1, queue_limit=10, queue_timeout=1, retry_after=1)
+
+    async def admit() -> None:
+        async with limiter.admit():
+            pass
+
+    # Act
+    async with limiter.admit():
+        waiter = asyncio.create_task(admit())
+        await asyncio.sleep(0)
+        waiter.cancel()  # The holder releases the slot before the cancelled waiter resumes
+    # Assert
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter._active == 0
+    assert not limiter._waiters
+
+
+@pytest.mark.asyncio
+async def test_overloaded_sub_app_responds_503_with_retry_after():
+    # Arrange
+    async def handler(request: web.Request) -> web.Response:
+        return web.Response()
+
+    error_handler_registry = ErrorHandlerRegistry()
+    error_handler_registry.add_handler(Overloaded, overloaded_error_handler)  # type: ignore
+    app = web.Application(middlewares=[error_handling_middleware])
+    app["error_handler_registry"] = error_handler_registry
+    app["admission_limiter"] = AdmissionLimiter(limit=0, queue_limit=10, queue_timeout=0.01, retry_after=5)
+    sub_app = web.Application(middlewares=[admission_control_middleware])
+    sub_app.router.add_post("", handler)
+    app.add_subapp("/api/v1/convert", sub_app)
+    async with TestClient(TestServer(app)) as client:
+        # Act
+        response = await client.post("/api/v1/convert")
+        # Assert
+        assert response.status == 503
+        assert response.headers["Retry-After"] == "5"
+
+
+@pytest.mark.asyncio
+async def test_admission_limiter_rejects_at_once_when_queue_is_full():
+    # Arrange
+    limiter = AdmissionLimiter(limit=1, queue_limit=1, queue_timeout=1, retry_after=1)
+
+    async def admit() -> None:
+        async with limiter.admit():
+            pass
+
+    # Act & Assert
+    async with limiter.admit():
+        waiter = asyncio.create_task(admit())
+        await asyncio.sleep(0)
+        async with asyncio.timeout(0.1):
+            with pytest.raises(Overloaded):
+                await admit()
+    await waiter
+    assert limiter._active == 0
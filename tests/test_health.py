@@ -0,0 +1,27 @@
+from unittest import mock
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from converter.warmup import WarmUp
+from health import health_app
+
+
+@pytest.mark.asyncio
+async def test_ready_responds_503_until_warm_up_is_complete():
+    # Arrange
+    warm_up = WarmUp({}, mock.AsyncMock())
+    app = web.Application()
+    app["warm_up"] = warm_up
+    app.add_subapp("/health", health_app)
+    async with TestClient(TestServer(app)) as client:
+        # Act
+        warming_up_response = await client.get("/health/ready")
+        await warm_up.run()
+        ready_response = await client.get("/health/ready")
+        # Assert
+        assert warming_up_response.status == 503
+        assert await warming_up_response.json() == {"status": "warming up"}
+        assert ready_response.status == 200
+        assert await ready_response.json() == {"status": "ready"}
@@ -0,0 +1,129 @@
+import pstats
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from tracing import (
+    NOOP_SPAN,
+    PROFILE_HEADER,
+    InMemorySpanExporter,
+    Tracer,
+    cpu_span,
+    server_timing,
+    span,
+    tracing_middleware,
+)
+
+
+@pytest.fixture
+def tracer():
+    return Tracer(
+        InMemorySpanExporter(max_spans=100), enabled=True, sample_rate=1, profiling_enabled=True, profile_sample_rate=1
+    )
+
+
+def create_traced_app(tracer: Tracer) -> web.Application:
+    async def handler(request: web.Request) -> web.Response:
+        with span("convert.service"):
+            return web.Response()
+
+    app = web.Application(middlewares=[tracing_middleware])
+    app["tracer"] = tracer
+    app.router.add_get("/", handler)
+    return app
+
+
+def test_span_is_noop_outside_of_trace():
+    # Act & Assert
+    assert span("redis.get") is NOOP_SPAN
+
+
+def test_spans_are_linked_and_exported(tracer: Tracer):
+    # Act
+    with (
+        tracer.start_trace("http.request") as root,
+        span("convert.service"),
+        span("redis.get", key="BTC:USDT:binance"),
+    ):
+        pass
+    # Assert
+    redis_span, service_span, root_span = tracer.exporter.get_finished_spans()
+    assert root_span is root
+    assert {redis_span.trace_id, service_span.trace_id} == {root.trace_id}
+    assert root_span.parent_span_id is None
+    assert service_span.parent_span_id == root.span_id
+    assert redis_span.parent_span_id == service_span.span_id
+    assert redis_span.to_otlp()["attributes"] == [{"key": "key", "value": {"stringValue": "BTC:USDT:binance"}}]
+    assert span("redis.get") is NOOP_SPAN
+
+
+def test_span_records_error(tracer: Tracer):
+    # Act
+    with pytest.raises(ValueError), tracer.start_trace("http.request"), span("convert.validation"):
+        raise ValueError()
+    # Assert
+    validation_span, _ = tracer.exporter.get_finished_spans()
+    assert validation_span.attributes["error.type"] == "ValueError"
+
+
+def test_server_timing_sums_stages_with_same_name(tracer: Tracer):
+    # Arrange
+    with tracer.start_trace("http.request") as root:
+        with span("redis.get"):
+            pass
+        with span("redis.get"):
+            pass
+    # Act
+    breakdown = server_timing(root.trace)
+    # Assert
+    assert [metric.split(";")[0] for metric in breakdown.split(", ")] == ["redis.get", "http.request"]
+
+
+@pytest.mark.asyncio
+async def test_profile_header_returns_stage_breakdown():
+    # Arrange
+    tracer = Tracer(InMemorySpanExporter(max_spans=100), False, 0, profiling_enabled=True, profile_sample_rate=1)
+    async with TestClient(TestServer(create_traced_app(tracer))) as client:
+        # Act
+        response = await client.get("/", headers={PROFILE_HEADER: "cpu"})
+    # Assert
+    assert [metric.split(";")[0] for metric in response.headers["Server-Timing"].split(", ")] == [
+        "convert.service",
+        "http.request",
+    ]
+    assert {finished_span.trace_id for finished_span in tracer.exporter.get_finished_spans()} == {
+        response.headers["X-Trace-Id"]
+    }
+
+
+@pytest.mark.asyncio
+async def test_profile_header_is_ignored_if_profiling_is_disabled():
+    # Arrange
+    tracer = Tracer(InMemorySpanExporter(max_spans=100), False, 0, profiling_enabled=False, profile_sample_rate=1)
+    async with TestClient(TestServer(create_traced_app(tracer))) as client:
+        # Act
+        response = await client.get("/", headers={PROFILE_HEADER: "cpu"})
+    # Assert
+    assert response.status == 200
+    assert "Server-Timing" not in response.headers
+    assert not tracer.exporter.get_finished_spans()
+
+
+def test_cpu_profile_covers_only_cpu_spans(tracer: Tracer):
+    # Arrange
+    def profiled_stage() -> None:
+        pass
+
+    def concurrent_request() -> None:
+        pass
+
+    # Act
+    with tracer.start_trace("http.request"), tracer.profile_cpu() as profiler:
+        concurrent_request()  # Runs on the event loop while the profiled request waits on I/O
+        with cpu_span("convert.validation"):
+            profiled_stage()
+    # Assert
+    functions = {function_name for _, _, function_name in pstats.Stats(profiler).stats}  # type: ignore[attr-defined]
+    assert "profiled_stage" in functions
+    assert "concurrent_request" not in functions